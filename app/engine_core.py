@@ -0,0 +1,154 @@
+"""撮合热路径的核心数据结构和同步函数
+
+每笔成交都会执行这里的代码。模块带完整类型注解，可在仓库根目录用mypyc编译为C扩展
+（编译产物与源文件同目录时优先被导入）：
+
+    mypyc app/engine_core.py
+
+编译后EngineOrder/EngineTrade成为原生类，下面函数对其整数字段的读写不再经过
+Python属性查找；models.py等其余模块仍按普通Python运行。未编译时行为一致。
+"""
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Optional
+import time
+import uuid
+
+from .models import (
+    OrderSide, OrderStatus, OrderType, PRICE_SCALE, QTY_SCALE,
+    ns_to_datetime, to_lots, to_ticks
+)
+
+
+# 撮合引擎内部使用的订单/成交：不走Pydantic校验，slots减少内存和属性访问开销
+# 输入在API边界由OrderRequest校验
+@dataclass(slots=True)
+class EngineOrder:
+    symbol: str
+    side: OrderSide
+    order_type: OrderType
+    quantity: float
+    user_id: str
+    price: Optional[float] = None
+    stop_price: Optional[float] = None
+    client_order_id: Optional[str] = None
+
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: OrderStatus = OrderStatus.PENDING
+    filled_quantity: float = 0
+    average_price: Optional[float] = None
+
+    # 撮合使用的整数表示，filled_quantity/average_price由其换算
+    price_ticks: Optional[int] = None
+    qty_lots: int = 0
+    filled_lots: int = 0
+    cum_notional: int = 0  # 累计成交额(tick*lot)，average_price = cum_notional / filled_lots / PRICE_SCALE
+
+    # 引擎内部使用纳秒时间戳（time.time_ns()），对外输出时再换算为datetime
+    created_at_ns: int = field(default_factory=time.time_ns)
+    updated_at_ns: int = 0
+    created_at: datetime = field(init=False)
+
+    def __post_init__(self):
+        if self.price is not None and self.price_ticks is None:
+            self.price_ticks = to_ticks(self.price)
+        if not self.qty_lots:
+            self.qty_lots = to_lots(self.quantity)
+        if not self.updated_at_ns:
+            self.updated_at_ns = self.created_at_ns
+        self.created_at = ns_to_datetime(self.created_at_ns)
+
+    @property
+    def updated_at(self) -> datetime:
+        return ns_to_datetime(self.updated_at_ns)
+
+    def to_dict(self) -> dict:
+        """对外输出的订单数据"""
+        data = asdict(self)
+        data["updated_at"] = self.updated_at
+        return data
+
+
+@dataclass(slots=True)
+class EngineTrade:
+    symbol: str
+    buy_order_id: str
+    sell_order_id: str
+    buyer_id: str
+    seller_id: str
+    qty_lots: int
+    price_ticks: int
+
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    timestamp_ns: int = field(default_factory=time.time_ns)
+
+    # 对外的浮点数量/价格，由整数表示换算
+    quantity: float = field(init=False)
+    price: float = field(init=False)
+
+    def __post_init__(self):
+        self.quantity = self.qty_lots / QTY_SCALE
+        self.price = self.price_ticks / PRICE_SCALE
+
+    @property
+    def timestamp(self) -> datetime:
+        return ns_to_datetime(self.timestamp_ns)
+
+    def to_dict(self) -> dict:
+        """对外输出的成交数据"""
+        data = asdict(self)
+        data["timestamp"] = self.timestamp
+        return data
+
+
+def price_matches(buy_order: EngineOrder, sell_order: EngineOrder) -> bool:
+    """检查买卖单价格是否匹配"""
+    # 市价单总是匹配
+    if buy_order.order_type == OrderType.MARKET or sell_order.order_type == OrderType.MARKET:
+        return True
+
+    # 限价单：买价 >= 卖价
+    buy_ticks = buy_order.price_ticks
+    sell_ticks = sell_order.price_ticks
+    if buy_ticks and sell_ticks:
+        return buy_ticks >= sell_ticks
+
+    return False
+
+
+def match_lots(buy_order: EngineOrder, sell_order: EngineOrder) -> int:
+    """可成交数量：双方剩余数量的较小值"""
+    buy_remaining: int = buy_order.qty_lots - buy_order.filled_lots
+    sell_remaining: int = sell_order.qty_lots - sell_order.filled_lots
+    return buy_remaining if buy_remaining < sell_remaining else sell_remaining
+
+
+def trade_price_ticks(buy_order: EngineOrder, sell_order: EngineOrder) -> Optional[int]:
+    """确定成交价格（价格优先，同为限价单时先下单的价格优先）"""
+    if buy_order.order_type == OrderType.MARKET:
+        return sell_order.price_ticks
+    if sell_order.order_type == OrderType.MARKET:
+        return buy_order.price_ticks
+    if buy_order.created_at_ns < sell_order.created_at_ns:
+        return buy_order.price_ticks
+    return sell_order.price_ticks
+
+
+def apply_fill(order: EngineOrder, trade_lots: int, trade_ticks: int) -> bool:
+    """按一笔成交更新订单的成交数量、均价和状态，返回订单是否已完全成交"""
+    # 更新已成交数量和累计成交额（整数累加，无精度损失）
+    filled_lots: int = order.filled_lots + trade_lots
+    cum_notional: int = order.cum_notional + trade_lots * trade_ticks
+    order.filled_lots = filled_lots
+    order.cum_notional = cum_notional
+
+    # 换算对外的浮点成交数量和平均成交价格
+    order.filled_quantity = filled_lots / QTY_SCALE
+    order.average_price = cum_notional / filled_lots / PRICE_SCALE
+
+    if filled_lots >= order.qty_lots:
+        order.status = OrderStatus.FILLED
+        return True
+
+    order.status = OrderStatus.PARTIAL
+    return False
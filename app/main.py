@@ -2,28 +2,98 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import logging
-from typing import Dict, List
-import json
+from typing import Dict, Optional, Set
+import msgspec
+import orjson
 
 from .routes import router
 from .matcher import matching_engine
+from .models import ClientMessage, SubscribeMessage, PlaceOrderMessage, ns_to_datetime
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 每个连接的发送队列上限，队列满时丢弃最旧的消息
+SEND_QUEUE_SIZE = 1024
+
+class ClientConnection:
+    """WebSocket连接及其发送队列（所有发送都经由独立的写任务）"""
+    
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.writer: Optional[asyncio.Task] = None
+        # 该连接订阅的交易对
+        self.symbols: Set[str] = set()
+        # 连接已移除（写任务失败或已断开），不再接受订阅
+        self.closed = False
+    
+    def send(self, payload: bytes):
+        """消息入队，不等待网络发送"""
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.queue.get_nowait()
+            self.queue.put_nowait(payload)
+
+# WebSocket客户端消息解码器
+client_message_decoder = msgspec.json.Decoder(ClientMessage)
+
 # 全局变量存储WebSocket连接
-active_connections: List[WebSocket] = []
+active_connections: Set[ClientConnection] = set()
+
+# 交易对订阅关系 {symbol: {connection}}
+subscriptions: Dict[str, Set[ClientConnection]] = {}
+
+def _drop_connection(connection: ClientConnection):
+    """移除连接及其全部订阅"""
+    connection.closed = True
+    active_connections.discard(connection)
+    for symbol in connection.symbols:
+        subscribers = subscriptions.get(symbol)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del subscriptions[symbol]
+    connection.symbols.clear()
+
+async def _writer(connection: ClientConnection):
+    """连接的写任务：取出队列中积压的全部消息，合并为一帧发送"""
+    queue = connection.queue
+    try:
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            
+            if len(batch) == 1:
+                await connection.websocket.send_bytes(batch[0])
+            else:
+                # 多条消息合并为JSON数组
+                await connection.websocket.send_bytes(b"[" + b",".join(batch) + b"]")
+    except Exception:
+        # 发送失败视为连接已断开：移除订阅并关闭连接，使接收循环随之退出
+        _drop_connection(connection)
+        try:
+            await connection.websocket.close()
+        except Exception:
+            pass
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时的初始化
     logger.info("🚀 OrderMatch 系统启动中...")
+    matching_engine.orderbook_listener = broadcast_orderbook_update
+    matching_engine.trade_listener = broadcast_trades
+    matching_engine.start()
     logger.info("📊 撮合引擎已准备就绪")
     yield
     # 关闭时的清理
     logger.info("🛑 OrderMatch 系统关闭中...")
+    await matching_engine.stop()
 
 app = FastAPI(
     title="OrderMatch 订单撮合系统",
@@ -60,101 +130,119 @@ def health_check():
         "status": "healthy",
         "service": "ordermatch",
         "engine_status": "running",
-        "active_orders": len(matching_engine.active_orders),
-        "total_trades": len(matching_engine.trades)
+        "active_orders": matching_engine.order_count(),
+        "total_trades": matching_engine.trade_count()
     }
 
 # WebSocket连接管理
 @app.websocket("/ws/orders")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    active_connections.append(websocket)
+    connection = ClientConnection(websocket)
+    connection.writer = asyncio.create_task(_writer(connection))
+    active_connections.add(connection)
     logger.info(f"WebSocket连接已建立，当前连接数: {len(active_connections)}")
     
     try:
         while True:
             data = await websocket.receive_text()
+            if connection.closed:
+                # 写任务已失败，连接只等待断开，不再处理消息
+                break
             try:
-                message = json.loads(data)
+                message = client_message_decoder.decode(data)
                 
                 # 处理不同类型的WebSocket消息
-                if message.get("type") == "subscribe":
+                if isinstance(message, SubscribeMessage):
                     # 订阅市场数据
-                    symbol = message.get("symbol", "BTC/USDT")
-                    await websocket.send_text(json.dumps({
+                    symbol = message.symbol
+                    subscriptions.setdefault(symbol, set()).add(connection)
+                    connection.symbols.add(symbol)
+                    connection.send(orjson.dumps({
                         "type": "subscribed",
                         "symbol": symbol,
                         "message": f"已订阅 {symbol} 市场数据"
                     }))
                 
-                elif message.get("type") == "place_order":
+                elif isinstance(message, PlaceOrderMessage):
                     # 通过WebSocket下单
-                    await websocket.send_text(json.dumps({
+                    connection.send(orjson.dumps({
                         "type": "info",
                         "message": "WebSocket下单功能开发中..."
                     }))
                 
-                else:
-                    # 回显消息
-                    await websocket.send_text(json.dumps({
-                        "type": "echo",
-                        "received": message
-                    }))
-                    
-            except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
+            except msgspec.ValidationError:
+                # 未知类型的消息：回显
+                connection.send(orjson.dumps({
+                    "type": "echo",
+                    "received": msgspec.json.decode(data)
+                }))
+                
+            except msgspec.DecodeError:
+                connection.send(orjson.dumps({
                     "type": "error",
                     "message": "消息格式错误，请发送JSON格式"
                 }))
                 
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
+        pass
+    finally:
+        # 无论正常断开还是接收/处理消息时出错，都要停止写任务并移除订阅
+        connection.writer.cancel()
+        _drop_connection(connection)
         logger.info(f"WebSocket连接已断开，当前连接数: {len(active_connections)}")
 
-# 广播消息到所有连接的客户端
-async def broadcast_message(message: dict):
-    """广播消息到所有WebSocket连接"""
-    if active_connections:
-        message_str = json.dumps(message)
-        disconnected = []
-        
-        for connection in active_connections:
-            try:
-                await connection.send_text(message_str)
-            except:
-                disconnected.append(connection)
-        
-        # 清理断开的连接
-        for connection in disconnected:
-            active_connections.remove(connection)
+def _send_payload(connections: Set[ClientConnection], payload: bytes):
+    # 每条消息只编码一次，所有连接共享同一份bytes；只入队不等待发送，慢连接不会阻塞广播
+    # （循环内无await，遍历期间集合不会变化）
+    for connection in connections:
+        connection.send(payload)
 
 # 广播交易信息（可以在撮合引擎中调用）
 async def broadcast_trade(trade):
     """广播交易信息"""
-    await broadcast_message({
+    connections = subscriptions.get(trade.symbol)
+    if not connections:
+        return
+    
+    _send_payload(connections, orjson.dumps({
         "type": "trade",
         "data": {
             "symbol": trade.symbol,
             "price": trade.price,
             "quantity": trade.quantity,
-            "timestamp": trade.timestamp.isoformat()
+            "timestamp": trade.timestamp
         }
-    })
+    }))
+
+# 批量广播成交（撮合分片每处理完一批订单调用一次）
+async def broadcast_trades(trades):
+    """批量广播成交信息"""
+    for trade in trades:
+        await broadcast_trade(trade)
 
 # 广播订单簿更新
 async def broadcast_orderbook_update(symbol: str):
     """广播订单簿更新"""
-    orderbook = matching_engine.get_orderbook(symbol)
-    if orderbook:
-        await broadcast_message({
-            "type": "orderbook",
-            "symbol": symbol,
-            "data": {
-                "bids": orderbook.bids[:10],  # 只发送前10档
-                "asks": orderbook.asks[:10],
-                "last_updated": orderbook.last_updated.isoformat()
-            }
-        })
+    connections = subscriptions.get(symbol)
+    if not connections:
+        return
+    shard = matching_engine.shard_for(symbol)
+    orderbook = shard.order_books.get(symbol)
+    if not orderbook:
+        return
+    
+    bids, asks = shard.get_depth(symbol, 10)  # 只发送前10档
+    _send_payload(connections, orjson.dumps({
+        "type": "orderbook",
+        "symbol": symbol,
+        "data": {
+            "bids": bids,
+            "asks": asks,
+            "last_updated": ns_to_datetime(shard.orderbook_updated_ns[symbol])
+        }
+    }))
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvicorn[standard]自带uvloop/httptools，显式指定避免回退到默认事件循环
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools", ws="websockets")
\ No newline at end of file
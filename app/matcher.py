@@ -1,16 +1,34 @@
-from typing import Dict, List, Optional, Tuple
-from collections import defaultdict
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+from collections import defaultdict, deque
+from itertools import islice
 import asyncio
+import heapq
 import logging
-from datetime import datetime
-
+import time
+import zlib
 from .models import (
-    Order, OrderSide, OrderStatus, OrderType, 
-    Trade, OrderBook, MarketData
+    OrderSide, OrderStatus, OrderType, OrderBook, MarketData, ns_to_datetime
 )
+from .orderbook import PriceLevelBook, LIVE_STATUSES
+from .engine_core import EngineOrder, EngineTrade, apply_fill, match_lots, price_matches, trade_price_ticks
 
 logger = logging.getLogger(__name__)
 
+# 每个交易对保留的最近成交记录条数
+MAX_TRADES_PER_SYMBOL = 100_000
+
+# 撮合引擎分片数
+NUM_SHARDS = 4
+
+# 分片消费任务每批最多处理的订单数
+MAX_BATCH_SIZE = 256
+
+# 每个分片待撮合订单队列的上限，队列满时拒绝新订单
+SHARD_QUEUE_SIZE = 4096
+
+# 订单簿快照刷新/推送间隔（秒），期间的多次变更合并为一次
+SNAPSHOT_INTERVAL = 0.05
+
 class MatchingEngine:
     """订单撮合引擎"""
     
@@ -19,24 +37,39 @@ class MatchingEngine:
         self.order_books: Dict[str, OrderBook] = {}
         
         # 活跃订单存储 {order_id: order}
-        self.active_orders: Dict[str, Order] = {}
+        self.active_orders: Dict[str, EngineOrder] = {}
         
-        # 按交易对分组的订单 {symbol: {buy_orders: [], sell_orders: []}}
-        self.orders_by_symbol: Dict[str, Dict[str, List[Order]]] = defaultdict(
-            lambda: {"buy_orders": [], "sell_orders": []}
-        )
+        # 用户未完成订单索引 {user_id: {order_id: None}}，字典保持下单顺序
+        self.orders_by_user: Dict[str, Dict[str, None]] = {}
+        
+        # 按交易对分组的价格档位簿 {symbol: PriceLevelBook}
+        self.orders_by_symbol: Dict[str, PriceLevelBook] = {}
         
         # 成交记录
-        self.trades: List[Trade] = []
+        self.trades: List[EngineTrade] = []
+        
+        # 按交易对分组的最近成交（按时间顺序追加） {symbol: deque[EngineTrade]}
+        self.trades_by_symbol: Dict[str, Deque[EngineTrade]] = defaultdict(
+            lambda: deque(maxlen=MAX_TRADES_PER_SYMBOL)
+        )
         
         # 市场数据
         self.market_data: Dict[str, MarketData] = {}
         
+        # 订单簿/市场数据最近更新的纳秒时间戳，对外输出时再换算为datetime
+        self.orderbook_updated_ns: Dict[str, int] = {}
+        self.market_data_updated_ns: Dict[str, int] = {}
+        
+        # 自上次快照以来订单簿有变化的交易对
+        self.dirty_symbols: Set[str] = set()
+        
         logger.info("撮合引擎已启动")
     
-    async def process_order(self, order: Order) -> List[Trade]:
+    async def process_order(self, order: EngineOrder) -> List[EngineTrade]:
         """处理新订单"""
-        logger.info(f"处理订单: {order.id}, {order.symbol}, {order.side}, {order.quantity}@{order.price}")
+        # 每个订单都会经过这里：只在开启DEBUG时格式化日志
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("处理订单: %s, %s, %s, %s@%s", order.id, order.symbol, order.side, order.quantity, order.price)
         
         # 验证订单
         if not self._validate_order(order):
@@ -46,221 +79,196 @@ class MatchingEngine:
         # 初始化订单簿（如果不存在）
         if order.symbol not in self.order_books:
             self.order_books[order.symbol] = OrderBook(symbol=order.symbol)
+            self.orders_by_symbol[order.symbol] = PriceLevelBook(order.symbol)
         
         # 存储订单
         self.active_orders[order.id] = order
+        self.orders_by_user.setdefault(order.user_id, {})[order.id] = None
         
         # 尝试撮合
-        trades = await self._match_order(order)
+        trades = self._match_order(order)
         
         # 如果订单未完全成交，加入订单簿
         if order.status != OrderStatus.FILLED:
-            self._add_to_orderbook(order)
+            if order.order_type == OrderType.MARKET:
+                # 市价单没有挂单价格，未成交部分直接撤销
+                order.status = OrderStatus.CANCELLED
+                self._untrack_user_order(order)
+            else:
+                self._add_to_orderbook(order)
         
         # 更新市场数据
         if trades:
-            await self._update_market_data(order.symbol, trades[-1])
+            self.dirty_symbols.add(order.symbol)
+            self._update_market_data(order.symbol, trades[-1])
         
         return trades
     
-    def _validate_order(self, order: Order) -> bool:
+    def _validate_order(self, order: EngineOrder) -> bool:
         """验证订单有效性"""
-        if order.quantity <= 0:
+        if order.qty_lots <= 0:
             logger.warning(f"订单数量无效: {order.quantity}")
             return False
         
-        if order.order_type == OrderType.LIMIT and (not order.price or order.price <= 0):
+        if order.order_type != OrderType.MARKET and (not order.price_ticks or order.price_ticks <= 0):
             logger.warning(f"限价单价格无效: {order.price}")
             return False
         
         return True
     
-    async def _match_order(self, new_order: Order) -> List[Trade]:
+    def _match_order(self, new_order: EngineOrder) -> List[EngineTrade]:
         """撮合订单"""
         trades = []
         orderbook = self.order_books[new_order.symbol]
         
         if new_order.side == OrderSide.BUY:
             # 买单与卖单撮合
-            trades = await self._match_buy_order(new_order, orderbook)
+            trades = self._match_buy_order(new_order, orderbook)
         else:
             # 卖单与买单撮合
-            trades = await self._match_sell_order(new_order, orderbook)
+            trades = self._match_sell_order(new_order, orderbook)
         
         return trades
     
-    async def _match_buy_order(self, buy_order: Order, orderbook: OrderBook) -> List[Trade]:
+    def _match_buy_order(self, buy_order: EngineOrder, orderbook: OrderBook) -> List[EngineTrade]:
         """撮合买单"""
         trades = []
-        symbol_orders = self.orders_by_symbol[buy_order.symbol]
+        book = self.orders_by_symbol[buy_order.symbol]
         
-        # 按价格排序的卖单（价格从低到高）
-        sell_orders = sorted(
-            [o for o in symbol_orders["sell_orders"] if o.status == OrderStatus.PENDING],
-            key=lambda x: (x.price or float('inf'), x.created_at)
-        )
+        is_market = buy_order.order_type == OrderType.MARKET
         
-        for sell_order in sell_orders:
-            if buy_order.quantity - buy_order.filled_quantity <= 0:
+        # 从最低卖价档位开始，同档位按时间先后成交
+        while buy_order.qty_lots - buy_order.filled_lots > 0:
+            queue = book.peek_asks()
+            if queue is None:
                 break
             
-            # 检查价格匹配
-            if not self._price_matches(buy_order, sell_order):
-                continue
+            # 市价单不检查价格；限价单堆顶不匹配则后续档位都不匹配
+            if not is_market and not price_matches(buy_order, queue[0]):
+                break
             
-            # 执行交易
-            trade = await self._execute_trade(buy_order, sell_order)
-            if trade:
+            # 依次吃掉该档位的挂单，直到本单成交完或档位耗尽
+            while queue and buy_order.qty_lots - buy_order.filled_lots > 0:
+                sell_order = queue[0]
+                if sell_order.status not in LIVE_STATUSES:
+                    queue.popleft()
+                    continue
+                
+                # 执行交易
+                trade = self._execute_trade(buy_order, sell_order)
+                if not trade:
+                    return trades
                 trades.append(trade)
-                self.trades.append(trade)
+                book.reduce(sell_order, trade.qty_lots)
+                
+                if sell_order.status == OrderStatus.FILLED:
+                    queue.popleft()
         
         return trades
     
-    async def _match_sell_order(self, sell_order: Order, orderbook: OrderBook) -> List[Trade]:
+    def _match_sell_order(self, sell_order: EngineOrder, orderbook: OrderBook) -> List[EngineTrade]:
         """撮合卖单"""
         trades = []
-        symbol_orders = self.orders_by_symbol[sell_order.symbol]
+        book = self.orders_by_symbol[sell_order.symbol]
         
-        # 按价格排序的买单（价格从高到低）
-        buy_orders = sorted(
-            [o for o in symbol_orders["buy_orders"] if o.status == OrderStatus.PENDING],
-            key=lambda x: (-(x.price or 0), x.created_at)
-        )
+        is_market = sell_order.order_type == OrderType.MARKET
         
-        for buy_order in buy_orders:
-            if sell_order.quantity - sell_order.filled_quantity <= 0:
+        # 从最高买价档位开始，同档位按时间先后成交
+        while sell_order.qty_lots - sell_order.filled_lots > 0:
+            queue = book.peek_bids()
+            if queue is None:
                 break
             
-            # 检查价格匹配
-            if not self._price_matches(buy_order, sell_order):
-                continue
+            # 市价单不检查价格；限价单堆顶不匹配则后续档位都不匹配
+            if not is_market and not price_matches(queue[0], sell_order):
+                break
             
-            # 执行交易
-            trade = await self._execute_trade(buy_order, sell_order)
-            if trade:
+            # 依次吃掉该档位的挂单，直到本单成交完或档位耗尽
+            while queue and sell_order.qty_lots - sell_order.filled_lots > 0:
+                buy_order = queue[0]
+                if buy_order.status not in LIVE_STATUSES:
+                    queue.popleft()
+                    continue
+                
+                # 执行交易
+                trade = self._execute_trade(buy_order, sell_order)
+                if not trade:
+                    return trades
                 trades.append(trade)
-                self.trades.append(trade)
+                book.reduce(buy_order, trade.qty_lots)
+                
+                if buy_order.status == OrderStatus.FILLED:
+                    queue.popleft()
         
         return trades
     
-    def _price_matches(self, buy_order: Order, sell_order: Order) -> bool:
-        """检查买卖单价格是否匹配"""
-        # 市价单总是匹配
-        if buy_order.order_type == OrderType.MARKET or sell_order.order_type == OrderType.MARKET:
-            return True
-        
-        # 限价单：买价 >= 卖价
-        if buy_order.price and sell_order.price:
-            return buy_order.price >= sell_order.price
-        
-        return False
-    
-    async def _execute_trade(self, buy_order: Order, sell_order: Order) -> Optional[Trade]:
+    def _execute_trade(self, buy_order: EngineOrder, sell_order: EngineOrder) -> Optional[EngineTrade]:
         """执行交易"""
         # 计算成交数量
-        buy_remaining = buy_order.quantity - buy_order.filled_quantity
-        sell_remaining = sell_order.quantity - sell_order.filled_quantity
-        trade_quantity = min(buy_remaining, sell_remaining)
-        
-        if trade_quantity <= 0:
+        trade_lots = match_lots(buy_order, sell_order)
+        if trade_lots <= 0:
             return None
         
         # 确定成交价格（价格优先原则）
-        if buy_order.order_type == OrderType.MARKET:
-            trade_price = sell_order.price
-        elif sell_order.order_type == OrderType.MARKET:
-            trade_price = buy_order.price
-        else:
-            # 时间优先：先下单的价格优先
-            if buy_order.created_at < sell_order.created_at:
-                trade_price = buy_order.price
-            else:
-                trade_price = sell_order.price
+        trade_ticks = trade_price_ticks(buy_order, sell_order)
         
         # 创建交易记录
-        trade = Trade(
+        trade = EngineTrade(
             symbol=buy_order.symbol,
             buy_order_id=buy_order.id,
             sell_order_id=sell_order.id,
             buyer_id=buy_order.user_id,
             seller_id=sell_order.user_id,
-            quantity=trade_quantity,
-            price=trade_price
+            qty_lots=trade_lots,
+            price_ticks=trade_ticks
         )
         
+        # 记录成交
+        self.trades.append(trade)
+        self.trades_by_symbol[trade.symbol].append(trade)
+        
         # 更新订单状态
-        await self._update_order_after_trade(buy_order, trade_quantity, trade_price)
-        await self._update_order_after_trade(sell_order, trade_quantity, trade_price)
+        self._update_order_after_trade(buy_order, trade_lots, trade_ticks)
+        self._update_order_after_trade(sell_order, trade_lots, trade_ticks)
         
-        logger.info(f"成交: {trade.quantity} {trade.symbol} @ {trade.price}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("成交: %s %s @ %s", trade.quantity, trade.symbol, trade.price)
         return trade
     
-    async def _update_order_after_trade(self, order: Order, trade_quantity: float, trade_price: float):
+    def _update_order_after_trade(self, order: EngineOrder, trade_lots: int, trade_ticks: int):
         """交易后更新订单状态"""
-        # 更新已成交数量
-        order.filled_quantity += trade_quantity
-        
-        # 更新平均成交价格
-        if order.average_price is None:
-            order.average_price = trade_price
-        else:
-            total_value = (order.filled_quantity - trade_quantity) * order.average_price
-            total_value += trade_quantity * trade_price
-            order.average_price = total_value / order.filled_quantity
+        if apply_fill(order, trade_lots, trade_ticks):
+            self._untrack_user_order(order)
         
-        # 更新订单状态
-        if order.filled_quantity >= order.quantity:
-            order.status = OrderStatus.FILLED
-        else:
-            order.status = OrderStatus.PARTIAL
-        
-        order.updated_at = datetime.utcnow()
+        order.updated_at_ns = time.time_ns()
+    
+    def _untrack_user_order(self, order: EngineOrder):
+        """订单结束（成交/撤销）后移出用户订单索引"""
+        user_orders = self.orders_by_user.get(order.user_id)
+        if user_orders is not None:
+            user_orders.pop(order.id, None)
+            if not user_orders:
+                del self.orders_by_user[order.user_id]
     
-    def _add_to_orderbook(self, order: Order):
+    def _add_to_orderbook(self, order: EngineOrder):
         """将订单加入订单簿"""
-        symbol_orders = self.orders_by_symbol[order.symbol]
+        self.orders_by_symbol[order.symbol].add(order)
         
-        if order.side == OrderSide.BUY:
-            symbol_orders["buy_orders"].append(order)
-        else:
-            symbol_orders["sell_orders"].append(order)
-        
-        # 更新订单簿快照
-        self._update_orderbook_snapshot(order.symbol)
+        # 标记订单簿有变化，由快照任务统一刷新
+        self.dirty_symbols.add(order.symbol)
     
     def _update_orderbook_snapshot(self, symbol: str):
-        """更新订单簿快照"""
-        symbol_orders = self.orders_by_symbol[symbol]
-        orderbook = self.order_books[symbol]
-        
-        # 聚合买单（按价格分组）
-        buy_levels = defaultdict(float)
-        for order in symbol_orders["buy_orders"]:
-            if order.status == OrderStatus.PENDING and order.price:
-                remaining = order.quantity - order.filled_quantity
-                buy_levels[order.price] += remaining
-        
-        # 聚合卖单（按价格分组）
-        sell_levels = defaultdict(float)
-        for order in symbol_orders["sell_orders"]:
-            if order.status == OrderStatus.PENDING and order.price:
-                remaining = order.quantity - order.filled_quantity
-                sell_levels[order.price] += remaining
-        
-        # 更新订单簿
-        orderbook.bids = [
-            {"price": price, "quantity": quantity}
-            for price, quantity in sorted(buy_levels.items(), reverse=True)
-        ]
-        
-        orderbook.asks = [
-            {"price": price, "quantity": quantity}
-            for price, quantity in sorted(sell_levels.items())
-        ]
-        
-        orderbook.last_updated = datetime.utcnow()
+        """更新订单簿快照（档位聚合数量已增量维护，完整深度在查询时生成）"""
+        self.orderbook_updated_ns[symbol] = time.time_ns()
     
-    async def _update_market_data(self, symbol: str, trade: Trade):
+    def flush_orderbook_snapshots(self) -> Set[str]:
+        """刷新所有有变化的交易对快照，返回这些交易对"""
+        symbols, self.dirty_symbols = self.dirty_symbols, set()
+        for symbol in symbols:
+            self._update_orderbook_snapshot(symbol)
+        return symbols
+    
+    def _update_market_data(self, symbol: str, trade: EngineTrade):
         """更新市场数据"""
         if symbol not in self.market_data:
             self.market_data[symbol] = MarketData(
@@ -279,17 +287,19 @@ class MatchingEngine:
         market_data.last_price = trade.price
         
         # 更新买一卖一价格
-        orderbook = self.order_books[symbol]
-        if orderbook.bids:
-            market_data.bid = orderbook.bids[0]["price"]
-        if orderbook.asks:
-            market_data.ask = orderbook.asks[0]["price"]
+        book = self.orders_by_symbol[symbol]
+        best_bid = book.best_bid()
+        if best_bid is not None:
+            market_data.bid = best_bid
+        best_ask = book.best_ask()
+        if best_ask is not None:
+            market_data.ask = best_ask
         
         # 计算24小时涨跌幅
         if old_price > 0:
             market_data.change_24h = ((trade.price - old_price) / old_price) * 100
         
-        market_data.timestamp = datetime.utcnow()
+        self.market_data_updated_ns[symbol] = time.time_ns()
     
     async def cancel_order(self, order_id: str, user_id: str) -> bool:
         """取消订单"""
@@ -308,7 +318,8 @@ class MatchingEngine:
         
         # 更新订单状态
         order.status = OrderStatus.CANCELLED
-        order.updated_at = datetime.utcnow()
+        order.updated_at_ns = time.time_ns()
+        self._untrack_user_order(order)
         
         # 从订单簿中移除
         self._remove_from_orderbook(order)
@@ -316,37 +327,227 @@ class MatchingEngine:
         logger.info(f"订单已取消: {order_id}")
         return True
     
-    def _remove_from_orderbook(self, order: Order):
+    def _remove_from_orderbook(self, order: EngineOrder):
         """从订单簿中移除订单"""
-        symbol_orders = self.orders_by_symbol[order.symbol]
+        remaining = order.qty_lots - order.filled_lots
+        self.orders_by_symbol[order.symbol].remove(order, remaining)
         
-        if order.side == OrderSide.BUY:
-            symbol_orders["buy_orders"] = [
-                o for o in symbol_orders["buy_orders"] if o.id != order.id
-            ]
-        else:
-            symbol_orders["sell_orders"] = [
-                o for o in symbol_orders["sell_orders"] if o.id != order.id
-            ]
-        
-        # 更新订单簿快照
-        self._update_orderbook_snapshot(order.symbol)
+        # 标记订单簿有变化，由快照任务统一刷新
+        self.dirty_symbols.add(order.symbol)
     
     def get_orderbook(self, symbol: str) -> Optional[OrderBook]:
         """获取订单簿"""
-        return self.order_books.get(symbol)
+        orderbook = self.order_books.get(symbol)
+        if orderbook:
+            orderbook.bids, orderbook.asks = self.orders_by_symbol[symbol].depth()
+            updated_ns = self.orderbook_updated_ns.get(symbol)
+            if updated_ns is not None:
+                orderbook.last_updated = ns_to_datetime(updated_ns)
+        return orderbook
+    
+    def get_depth(self, symbol: str, limit: int = 10) -> Optional[Tuple[List[dict], List[dict]]]:
+        """获取前N档聚合深度（不生成完整订单簿）"""
+        book = self.orders_by_symbol.get(symbol)
+        if book is None:
+            return None
+        return book.depth(limit)
     
     def get_market_data(self, symbol: str) -> Optional[MarketData]:
         """获取市场数据"""
-        return self.market_data.get(symbol)
+        market_data = self.market_data.get(symbol)
+        if market_data:
+            market_data.timestamp = ns_to_datetime(self.market_data_updated_ns[symbol])
+        return market_data
     
-    def get_order(self, order_id: str) -> Optional[Order]:
+    def get_order(self, order_id: str) -> Optional[EngineOrder]:
         """获取订单"""
         return self.active_orders.get(order_id)
     
-    def get_user_orders(self, user_id: str) -> List[Order]:
-        """获取用户的所有订单"""
+    def get_user_orders(self, user_id: str) -> List[EngineOrder]:
+        """获取用户的未完成订单（按下单顺序）"""
         return [
-            order for order in self.active_orders.values()
-            if order.user_id == user_id
-        ] 
\ No newline at end of file
+            self.active_orders[order_id]
+            for order_id in self.orders_by_user.get(user_id, ())
+        ]
+    
+    def get_trades(self, symbol: str, limit: int) -> List[EngineTrade]:
+        """获取交易对最新的成交（按时间倒序）"""
+        trades = self.trades_by_symbol.get(symbol)
+        if not trades:
+            return []
+        # 成交按时间顺序追加，倒序取最新的交易
+        return list(islice(reversed(trades), max(limit, 0)))
+
+
+class ShardRouter:
+    """按交易对分片的撮合引擎路由
+    
+    每个分片是一个独立的MatchingEngine，独占自己的订单簿、订单和成交数据；
+    下单请求经分片自己的有界队列交给该分片的消费任务批量串行处理。
+    
+    这只是进程内的路由边界，不提供多核扩展：所有分片的消费任务运行在同一个事件循环（同一线程）上，
+    撮合是纯CPU计算，分片之间并不并行，热门交易对的一批撮合同样会占住事件循环。
+    每个订单反而多了一次入队和一个Future的开销，换来的是按交易对隔离的状态、按积压自适应的批处理，
+    以及把分片移到独立进程时不需要改变的调用接口。
+    
+    消费任务每批最多处理MAX_BATCH_SIZE个订单后让出事件循环；队列积压超过SHARD_QUEUE_SIZE时直接拒绝新订单。
+    """
+    
+    def __init__(self, num_shards: int = NUM_SHARDS):
+        self.shards: List[MatchingEngine] = [MatchingEngine() for _ in range(num_shards)]
+        self.queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(num_shards)]
+        self.workers: List[asyncio.Task] = []
+        
+        # 订单簿快照刷新后的回调（如WebSocket推送），参数为交易对
+        self.orderbook_listener: Optional[Callable[[str], Awaitable[None]]] = None
+        
+        # 每批订单撮合完成后的回调，参数为该批产生的全部成交
+        self.trade_listener: Optional[Callable[[List[EngineTrade]], Awaitable[None]]] = None
+    
+    def start(self):
+        """启动各分片的消费任务和订单簿快照任务"""
+        if not self.workers:
+            self.workers = [
+                asyncio.create_task(self._worker(shard, queue))
+                for shard, queue in zip(self.shards, self.queues)
+            ]
+            self.workers.append(asyncio.create_task(self._snapshot_loop()))
+    
+    async def stop(self):
+        """停止所有后台任务，队列中尚未撮合的订单直接失败"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        
+        # 消费任务已停止，积压的订单不会再被处理，通知等待方避免其一直挂起
+        for queue in self.queues:
+            while not queue.empty():
+                order, future = queue.get_nowait()
+                order.status = OrderStatus.REJECTED
+                if not future.done():
+                    future.set_exception(RuntimeError("撮合引擎已停止"))
+    
+    async def _snapshot_loop(self):
+        """按固定频率刷新有变化的订单簿快照并通知监听者"""
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            for shard in self.shards:
+                for symbol in shard.flush_orderbook_snapshots():
+                    if self.orderbook_listener is None:
+                        continue
+                    try:
+                        await self.orderbook_listener(symbol)
+                    except Exception as e:
+                        logger.error(f"订单簿推送失败: {symbol}, {str(e)}")
+    
+    def _shard_index(self, symbol: str) -> int:
+        # 使用稳定哈希（内置hash()对str每个进程随机）
+        return zlib.crc32(symbol.encode()) % len(self.shards)
+    
+    def shard_for(self, symbol: str) -> MatchingEngine:
+        """交易对所在的分片"""
+        return self.shards[self._shard_index(symbol)]
+    
+    async def _worker(self, shard: MatchingEngine, queue: asyncio.Queue):
+        """分片消费任务：一次取出队列中积压的订单（最多MAX_BATCH_SIZE个），按到达顺序撮合"""
+        while True:
+            # 空闲时等待单个订单，繁忙时批量取出，批大小随积压量自适应
+            batch = [await queue.get()]
+            while len(batch) < MAX_BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+            
+            batch_trades: List[EngineTrade] = []
+            for order, future in batch:
+                try:
+                    trades = await shard.process_order(order)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    batch_trades.extend(trades)
+                    if not future.done():
+                        future.set_result(trades)
+            
+            # 每批只通知一次成交
+            if batch_trades and self.trade_listener is not None:
+                try:
+                    await self.trade_listener(batch_trades)
+                except Exception as e:
+                    logger.error(f"成交推送失败: {str(e)}")
+            
+            # 队列中仍有积压时queue.get()不会挂起，每批之后主动让出事件循环
+            await asyncio.sleep(0)
+    
+    async def process_order(self, order: EngineOrder) -> List[EngineTrade]:
+        """将订单路由到所在分片，等待撮合结果"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queues[self._shard_index(order.symbol)].put_nowait((order, future))
+        except asyncio.QueueFull:
+            logger.warning(f"分片队列已满，拒绝订单: {order.id}")
+            order.status = OrderStatus.REJECTED
+            return []
+        return await future
+    
+    async def cancel_order(self, order_id: str, user_id: str) -> bool:
+        """取消订单（撮合方法内部没有真正的让出点，直接在所在分片上执行）"""
+        for shard in self.shards:
+            if order_id in shard.active_orders:
+                return await shard.cancel_order(order_id, user_id)
+        return False
+    
+    def get_orderbook(self, symbol: str) -> Optional[OrderBook]:
+        """获取订单簿"""
+        return self.shard_for(symbol).get_orderbook(symbol)
+    
+    def get_depth(self, symbol: str, limit: int = 10) -> Optional[Tuple[List[dict], List[dict]]]:
+        """获取前N档聚合深度"""
+        return self.shard_for(symbol).get_depth(symbol, limit)
+    
+    def get_market_data(self, symbol: str) -> Optional[MarketData]:
+        """获取市场数据"""
+        return self.shard_for(symbol).get_market_data(symbol)
+    
+    def get_order(self, order_id: str) -> Optional[EngineOrder]:
+        """获取订单"""
+        for shard in self.shards:
+            order = shard.get_order(order_id)
+            if order:
+                return order
+        return None
+    
+    def get_user_orders(self, user_id: str) -> List[EngineOrder]:
+        """获取用户的未完成订单（按下单时间归并各分片）"""
+        return list(heapq.merge(
+            *(shard.get_user_orders(user_id) for shard in self.shards),
+            key=lambda order: order.created_at_ns
+        ))
+    
+    def get_trades(self, symbol: str, limit: int) -> List[EngineTrade]:
+        """获取交易对最新的成交"""
+        return self.shard_for(symbol).get_trades(symbol, limit)
+    
+    def get_all_trades(self, limit: int) -> List[EngineTrade]:
+        """获取所有交易对最新的成交（按时间倒序归并各分片）"""
+        merged = heapq.merge(
+            *(reversed(shard.trades) for shard in self.shards),
+            key=lambda trade: trade.timestamp_ns,
+            reverse=True
+        )
+        return list(islice(merged, max(limit, 0)))
+    
+    def order_count(self) -> int:
+        return sum(len(shard.active_orders) for shard in self.shards)
+    
+    def trade_count(self) -> int:
+        return sum(len(shard.trades) for shard in self.shards)
+    
+    def symbols(self) -> List[str]:
+        return [symbol for shard in self.shards for symbol in shard.order_books]
+
+
+# 全局撮合引擎实例
+matching_engine = ShardRouter()
+ 
\ No newline at end of file
@@ -1,23 +1,28 @@
 from pydantic import BaseModel,Field
+from datetime import datetime,timezone
+from enum import Enum
+from typing import Dict,List,Optional,Union
+import msgspec
+import uuid
 
 
 
 
 class OrderType(str,Enum):
-    Limit="limit"
-    Market="market"
-    Stop="stop"
+    LIMIT="limit"
+    MARKET="market"
+    STOP="stop"
 
 class OrderSide(str,Enum):
-    Buy="buy"
-    Sell="sell"
+    BUY="buy"
+    SELL="sell"
 
 class OrderStatus(str,Enum):
-    Pending="pending"
-    Partial="partial"
-    Filled="filled"
-    Cancelled="cancelled"
-    Rejected="rejected"
+    PENDING="pending"
+    PARTIAL="partial"
+    FILLED="filled"
+    CANCELLED="cancelled"
+    REJECTED="rejected"
 
 class UserStatus(str,Enum):
     Active="active"
@@ -37,7 +42,7 @@ class Order(BaseModel):
     stop_price:Optional[float]=Field(None,gt=0)
 
 
-    status:OrderStatus=Field(default=OrderStatus.Pending)
+    status:OrderStatus=Field(default=OrderStatus.PENDING)
     filled_quantity:float=Field(default=0)
     average_price:Optional[float]=Field(None)
 
@@ -45,7 +50,58 @@ class Order(BaseModel):
     updated_at:datetime=Field(default_factory=lambda: datetime.now(timezone.utc))
 
     user_id:str=Field(...)
-    client_order_id:str=Field(...)
+    client_order_id:Optional[str]=Field(None)
+
+
+class OrderRequest(BaseModel):
+    """下单请求"""
+    symbol:str=Field(...)
+    side:OrderSide=Field(...)
+    order_type:OrderType=Field(...)
+    quantity:float=Field(...,gt=0)
+    price:Optional[float]=Field(None,gt=0)
+    stop_price:Optional[float]=Field(None,gt=0)
+
+    user_id:str=Field(...)
+    client_order_id:Optional[str]=Field(None)
+
+class OrderResponse(BaseModel):
+    """下单响应"""
+    success:bool
+    message:str
+    order_id:Optional[str]=None
+    order:Optional[Order]=None
+
+class CancelOrderRequest(BaseModel):
+    """撤单请求"""
+    order_id:str=Field(...)
+    user_id:str=Field(...)
+
+class Trade(BaseModel):
+    """成交记录"""
+    id:str=Field(default_factory=lambda: str(uuid.uuid4()))
+    symbol:str=Field(...)
+    buy_order_id:str=Field(...)
+    sell_order_id:str=Field(...)
+    buyer_id:str=Field(...)
+    seller_id:str=Field(...)
+    quantity:float=Field(...,gt=0)
+    price:float=Field(...,gt=0)
+    timestamp:datetime=Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# 定点精度：引擎内部以整数tick(价格)/lot(数量)撮合，对外接口仍为浮点
+PRICE_SCALE=10**8
+QTY_SCALE=10**8
+
+def to_ticks(price:float)->int:
+    return round(price*PRICE_SCALE)
+
+def to_lots(quantity:float)->int:
+    return round(quantity*QTY_SCALE)
+
+def ns_to_datetime(ns:int)->datetime:
+    return datetime.fromtimestamp(ns/1e9,tz=timezone.utc)
 
 
 class User(BaseModel):
@@ -185,6 +241,29 @@ class BalanceResponse(BaseModel):
     balances: Dict[str, UserBalance]
     total_value_usdt: float = Field(description="总价值(USDT)")
 
-# class OrderBook(BaseModel):
-
-# class OrderBook(BaseModel):
\ No newline at end of file
+# WebSocket客户端消息（msgspec按type字段分派）
+class SubscribeMessage(msgspec.Struct, tag_field="type", tag="subscribe"):
+    """订阅市场数据"""
+    symbol: str = "BTC/USDT"
+
+class PlaceOrderMessage(msgspec.Struct, tag_field="type", tag="place_order"):
+    """通过WebSocket下单"""
+
+ClientMessage = Union[SubscribeMessage, PlaceOrderMessage]
+
+class OrderBook(BaseModel):
+    """订单簿深度"""
+    symbol: str = Field(..., description="交易对")
+    bids: List[Dict[str, float]] = Field(default_factory=list, description="买盘档位")
+    asks: List[Dict[str, float]] = Field(default_factory=list, description="卖盘档位")
+    last_updated: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class MarketData(BaseModel):
+    """市场行情"""
+    symbol: str = Field(..., description="交易对")
+    last_price: float = Field(..., description="最新成交价")
+    bid: float = Field(default=0, description="买一价")
+    ask: float = Field(default=0, description="卖一价")
+    volume_24h: float = Field(default=0, description="24小时成交量")
+    change_24h: float = Field(default=0, description="24小时涨跌幅(%)")
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,112 @@
+import heapq
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedDict
+
+from .engine_core import EngineOrder
+from .models import OrderSide, OrderStatus, PRICE_SCALE, QTY_SCALE
+
+# 仍可参与撮合的挂单状态
+LIVE_STATUSES = (OrderStatus.PENDING, OrderStatus.PARTIAL)
+
+
+class PriceLevelBook:
+    """单个交易对的价格档位簿：价格堆 + 每档FIFO队列（价格为整数tick，数量为整数lot）"""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+
+        # 价格堆：买方存负价格（堆顶为最高买价），卖方存正价格（堆顶为最低卖价）
+        # 每个价格在堆中只出现一次，与下面的档位字典一一对应
+        self.bids_heap: List[int] = []
+        self.asks_heap: List[int] = []
+
+        # 价格档位 {price_ticks: deque[EngineOrder]}，同价按时间先后排队
+        self.bid_queues: Dict[int, Deque[EngineOrder]] = {}
+        self.ask_queues: Dict[int, Deque[EngineOrder]] = {}
+
+        # 按价格聚合的剩余挂单数量 {price_ticks: lots}，随挂单/成交/撤单增量维护
+        self.bid_levels: SortedDict = SortedDict()
+        self.ask_levels: SortedDict = SortedDict()
+
+    def add(self, order: EngineOrder):
+        """挂单：追加到对应价格档位队尾"""
+        price = order.price_ticks
+        if order.side == OrderSide.BUY:
+            queues, heap, key = self.bid_queues, self.bids_heap, -price
+            levels = self.bid_levels
+        else:
+            queues, heap, key = self.ask_queues, self.asks_heap, price
+            levels = self.ask_levels
+
+        queue = queues.get(price)
+        if queue is None:
+            queue = queues[price] = deque()
+            heapq.heappush(heap, key)
+        queue.append(order)
+
+        levels[price] = levels.get(price, 0) + (order.qty_lots - order.filled_lots)
+
+    def remove(self, order: EngineOrder, quantity: int):
+        """撤单：订单状态即为墓碑标记，队列中的订单到达队首时惰性跳过"""
+        self.reduce(order, quantity)
+
+    def reduce(self, order: EngineOrder, quantity: int):
+        """挂单成交或撤单后扣减对应档位的聚合数量"""
+        levels = self.bid_levels if order.side == OrderSide.BUY else self.ask_levels
+        remaining = levels.get(order.price_ticks, 0) - quantity
+        if remaining > 0:
+            levels[order.price_ticks] = remaining
+        else:
+            levels.pop(order.price_ticks, None)
+
+    def best_bid(self) -> Optional[float]:
+        """买一价，无买盘时为None"""
+        if not self.bid_levels:
+            return None
+        return self.bid_levels.peekitem(-1)[0] / PRICE_SCALE
+
+    def best_ask(self) -> Optional[float]:
+        """卖一价，无卖盘时为None"""
+        if not self.ask_levels:
+            return None
+        return self.ask_levels.peekitem(0)[0] / PRICE_SCALE
+
+    def depth(self, limit: Optional[int] = None) -> Tuple[List[dict], List[dict]]:
+        """返回前N档聚合深度（买方价格从高到低，卖方从低到高），换算为浮点价格/数量"""
+        bids = [
+            {"price": ticks / PRICE_SCALE, "quantity": lots / QTY_SCALE}
+            for ticks, lots in islice(reversed(self.bid_levels.items()), limit)
+        ]
+        asks = [
+            {"price": ticks / PRICE_SCALE, "quantity": lots / QTY_SCALE}
+            for ticks, lots in islice(self.ask_levels.items(), limit)
+        ]
+        return bids, asks
+
+    def peek_bids(self) -> Optional[Deque[EngineOrder]]:
+        """最优买价档位队列，队首即下一笔可成交的买单"""
+        return self._peek(self.bids_heap, self.bid_queues, -1)
+
+    def peek_asks(self) -> Optional[Deque[EngineOrder]]:
+        """最优卖价档位队列，队首即下一笔可成交的卖单"""
+        return self._peek(self.asks_heap, self.ask_queues, 1)
+
+    def _peek(self, heap: List[int], queues: Dict[int, Deque[EngineOrder]], sign: int) -> Optional[Deque[EngineOrder]]:
+        while heap:
+            price = heap[0] * sign
+            queue = queues[price]
+
+            # 跳过已成交/已取消的队首订单
+            while queue and queue[0].status not in LIVE_STATUSES:
+                queue.popleft()
+            if queue:
+                return queue
+
+            # 档位已空，弹出该价格
+            heapq.heappop(heap)
+            del queues[price]
+
+        return None
@@ -1,18 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Optional
+from typing import List, Optional, Set, Tuple
+import asyncio
 import logging
 
 from .models import (
     Order, OrderRequest, OrderResponse, CancelOrderRequest,
     OrderBook, MarketData, Trade, User
 )
-from .matcher import MatchingEngine
+from .engine_core import EngineOrder, EngineTrade
+from .matcher import matching_engine
 
 logger = logging.getLogger(__name__)
 
-# 创建全局撮合引擎实例
-matching_engine = MatchingEngine()
-
 # 创建路由
 router = APIRouter()
 
@@ -27,21 +26,37 @@ async def get_user_balance(user_id: str) -> dict:
     """获取用户余额"""
     return user_balances.get(user_id, {"BTC": 0.0, "USDT": 0.0})
 
-async def check_balance(user_id: str, symbol: str, side: str, quantity: float, price: float) -> bool:
-    """检查用户余额是否足够"""
-    balance = await get_user_balance(user_id)
+def reserve_balance(user_id: str, symbol: str, side: str, quantity: float, price: float) -> Optional[Tuple[str, float]]:
+    """检查用户余额是否足够并冻结下单所需金额，余额不足时返回None
     
+    同步执行，检查和扣减之间没有让出点：订单在分片队列中等待撮合期间，
+    同一用户的其他下单请求看到的是已扣减后的余额，不会重复使用同一笔余额
+    """
+    base_symbol, quote_symbol = symbol.split("/")
     if side == "buy":
-        # 买单需要检查计价货币余额
-        base_symbol, quote_symbol = symbol.split("/")
-        required_amount = quantity * price
-        return balance.get(quote_symbol, 0) >= required_amount
+        # 买单需要冻结计价货币
+        asset, amount = quote_symbol, quantity * price
     else:
-        # 卖单需要检查基础货币余额
-        base_symbol, quote_symbol = symbol.split("/")
-        return balance.get(base_symbol, 0) >= quantity
+        # 卖单需要冻结基础货币
+        asset, amount = base_symbol, quantity
+    
+    balance = user_balances.get(user_id)
+    available = balance.get(asset, 0) if balance else 0
+    if available < amount:
+        return None
+    
+    if balance is not None:
+        balance[asset] = available - amount
+    return asset, amount
+
+def release_balance(user_id: str, reservation: Tuple[str, float]):
+    """撮合结束后解冻下单时冻结的金额（实际成交由update_balance_after_trade结算）"""
+    asset, amount = reservation
+    balance = user_balances.get(user_id)
+    if balance is not None:
+        balance[asset] = balance.get(asset, 0) + amount
 
-async def update_balance_after_trade(trade: Trade):
+async def update_balance_after_trade(trade: EngineTrade):
     """交易后更新用户余额"""
     base_symbol, quote_symbol = trade.symbol.split("/")
     trade_value = trade.quantity * trade.price
@@ -56,26 +71,27 @@ async def update_balance_after_trade(trade: Trade):
         user_balances[trade.seller_id][base_symbol] -= trade.quantity
         user_balances[trade.seller_id][quote_symbol] += trade_value
 
+# 已提交撮合、尚未完成结算的下单任务（保留引用，避免任务完成前被回收）
+pending_settlements: Set[asyncio.Task] = set()
+
+async def execute_order(order: EngineOrder, reservation: Tuple[str, float]) -> List[EngineTrade]:
+    """提交订单撮合并完成结算：解冻下单时冻结的金额，按实际成交更新双方余额"""
+    try:
+        trades = await matching_engine.process_order(order)
+    finally:
+        # 解冻后按实际成交结算，两步之间没有让出点
+        release_balance(order.user_id, reservation)
+    
+    for trade in trades:
+        await update_balance_after_trade(trade)
+    return trades
+
 @router.post("/orders", response_model=OrderResponse)
 async def place_order(order_request: OrderRequest):
     """下单"""
     try:
-        # 检查用户余额
-        if not await check_balance(
-            order_request.user_id,
-            order_request.symbol,
-            order_request.side.value,
-            order_request.quantity,
-            order_request.price or 0
-        ):
-            return OrderResponse(
-                success=False,
-                message="余额不足",
-                order_id=None
-            )
-        
-        # 创建订单
-        order = Order(
+        # 创建订单（请求已由OrderRequest校验，引擎内部使用dataclass）
+        order = EngineOrder(
             symbol=order_request.symbol,
             side=order_request.side,
             order_type=order_request.order_type,
@@ -86,18 +102,33 @@ async def place_order(order_request: OrderRequest):
             client_order_id=order_request.client_order_id
         )
         
-        # 发送到撮合引擎
-        trades = await matching_engine.process_order(order)
+        # 检查并冻结用户余额（必须在等待撮合之前完成）
+        reservation = reserve_balance(
+            order_request.user_id,
+            order_request.symbol,
+            order_request.side.value,
+            order_request.quantity,
+            order_request.price or 0
+        )
+        if reservation is None:
+            return OrderResponse(
+                success=False,
+                message="余额不足",
+                order_id=None
+            )
         
-        # 更新用户余额
-        for trade in trades:
-            await update_balance_after_trade(trade)
+        # 撮合和结算在独立任务中完成：请求处理被取消（客户端断开、超时、停机）时，
+        # 已提交的订单仍会解冻并按成交结算，双方余额与撮合结果保持一致
+        task = asyncio.create_task(execute_order(order, reservation))
+        pending_settlements.add(task)
+        task.add_done_callback(pending_settlements.discard)
+        await asyncio.shield(task)
         
         return OrderResponse(
             success=True,
             message="订单已提交",
             order_id=order.id,
-            order=order
+            order=order.to_dict()
         )
         
     except Exception as e:
@@ -129,13 +160,13 @@ async def get_order(order_id: str):
     order = matching_engine.get_order(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="订单不存在")
-    return order
+    return order.to_dict()
 
 @router.get("/users/{user_id}/orders", response_model=List[Order])
 async def get_user_orders(user_id: str):
-    """获取用户的所有订单"""
+    """获取用户的未完成订单"""
     orders = matching_engine.get_user_orders(user_id)
-    return orders
+    return [order.to_dict() for order in orders]
 
 @router.get("/users/{user_id}/balance")
 async def get_user_balance_api(user_id: str):
@@ -165,29 +196,20 @@ async def get_market_data(symbol: str):
 @router.get("/trades/{symbol}", response_model=List[Trade])
 async def get_trades(symbol: str, limit: int = 100):
     """获取交易历史"""
-    # 过滤指定交易对的交易记录
-    trades = [
-        trade for trade in matching_engine.trades
-        if trade.symbol == symbol
-    ]
-    
-    # 按时间倒序排列，返回最新的交易
-    trades.sort(key=lambda x: x.timestamp, reverse=True)
-    return trades[:limit]
+    return [trade.to_dict() for trade in matching_engine.get_trades(symbol, limit)]
 
-@router.get("/trades")
+@router.get("/trades", response_model=List[Trade])
 async def get_all_trades(limit: int = 100):
     """获取所有交易历史"""
-    trades = sorted(matching_engine.trades, key=lambda x: x.timestamp, reverse=True)
-    return trades[:limit]
+    return [trade.to_dict() for trade in matching_engine.get_all_trades(limit)]
 
 @router.get("/stats")
 async def get_system_stats():
     """获取系统统计信息"""
     return {
-        "total_orders": len(matching_engine.active_orders),
-        "total_trades": len(matching_engine.trades),
-        "active_symbols": list(matching_engine.order_books.keys()),
+        "total_orders": matching_engine.order_count(),
+        "total_trades": matching_engine.trade_count(),
+        "active_symbols": matching_engine.symbols(),
         "system_status": "running"
     }
 
@@ -225,7 +247,7 @@ async def init_test_data():
     
     created_orders = []
     for order_req in test_orders:
-        order = Order(
+        order = EngineOrder(
             symbol=order_req.symbol,
             side=order_req.side,
             order_type=order_req.order_type,
@@ -0,0 +1,251 @@
+import asyncio
+import copy
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, routes
+from app.engine_core import EngineOrder
+from app.matcher import ShardRouter
+from app.models import OrderRequest, OrderSide, OrderType
+
+SYMBOL = "BTC/USDT"
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """每个测试使用独立的撮合引擎和余额数据"""
+    engine = ShardRouter()
+    monkeypatch.setattr(main, "matching_engine", engine)
+    monkeypatch.setattr(routes, "matching_engine", engine)
+    monkeypatch.setattr(routes, "user_balances", copy.deepcopy(routes.user_balances))
+    return engine
+
+
+@pytest.fixture
+def client(engine):
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _place(client, side, quantity, price=None, user_id="user123", **extra):
+    body = {
+        "symbol": SYMBOL,
+        "side": side,
+        "order_type": "limit" if price is not None else "market",
+        "quantity": quantity,
+        "user_id": user_id,
+        **extra,
+    }
+    if price is not None:
+        body["price"] = price
+    response = client.post("/api/v1/orders", json=body)
+    assert response.status_code == 200
+    return response.json()
+
+
+def _receive(websocket):
+    """接收一帧推送，写任务合并发送的JSON数组展开为多条消息"""
+    message = json.loads(websocket.receive_bytes())
+    return message if isinstance(message, list) else [message]
+
+
+def test_place_and_query_orders(client):
+    sell = _place(client, "sell", 1, 49000, "user456")
+    assert sell["success"]
+    assert sell["order"]["status"] == "pending"
+    assert sell["order"]["client_order_id"] is None
+
+    buy = _place(client, "buy", 0.5, 49500, client_order_id="c-1")
+    assert buy["success"]
+    assert buy["order"]["status"] == "filled"
+    assert buy["order"]["average_price"] == 49000
+
+    response = client.get(f"/api/v1/orders/{sell['order_id']}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "partial"
+    assert response.json()["filled_quantity"] == 0.5
+
+    assert client.get("/api/v1/orders/missing").status_code == 404
+
+
+def test_user_orders_in_placement_order(client):
+    ids = [_place(client, "sell", 0.1, 50000 + i, "user456")["order_id"] for i in range(5)]
+
+    response = client.get("/api/v1/users/user456/orders")
+    assert response.status_code == 200
+    assert [order["id"] for order in response.json()] == ids
+
+
+def test_insufficient_balance_is_rejected(client):
+    result = _place(client, "buy", 10, 49000, "user789")
+    assert not result["success"]
+    assert result["message"] == "余额不足"
+    assert client.get("/api/v1/users/user789/orders").json() == []
+
+
+def test_invalid_order_request_fails_validation(client):
+    response = client.post("/api/v1/orders", json={
+        "symbol": SYMBOL, "side": "buy", "order_type": "limit",
+        "quantity": -1, "price": 100, "user_id": "user123",
+    })
+    assert response.status_code == 422
+
+
+def test_trades_settle_balances_and_expose_public_fields(client):
+    _place(client, "sell", 1, 49000, "user456")
+    _place(client, "buy", 1, 49000, "user123")
+
+    balances = client.get("/api/v1/users/user123/balance").json()["balances"]
+    assert balances == {"BTC": 11.0, "USDT": 51000.0}
+    balances = client.get("/api/v1/users/user456/balance").json()["balances"]
+    assert balances == {"BTC": 4.0, "USDT": 99000.0}
+
+    trades = client.get("/api/v1/trades").json()
+    assert len(trades) == 1
+    assert set(trades[0]) == {
+        "id", "symbol", "buy_order_id", "sell_order_id",
+        "buyer_id", "seller_id", "quantity", "price", "timestamp",
+    }
+    assert trades[0]["buyer_id"] == "user123"
+    assert trades[0]["quantity"] == 1 and trades[0]["price"] == 49000
+
+
+def test_cancel_order(client):
+    order_id = _place(client, "sell", 1, 49000, "user456")["order_id"]
+
+    response = client.delete(f"/api/v1/orders/{order_id}", params={"user_id": "user123"})
+    assert response.json()["success"] is False
+
+    response = client.delete(f"/api/v1/orders/{order_id}", params={"user_id": "user456"})
+    assert response.json()["success"] is True
+    assert client.get(f"/api/v1/orders/{order_id}").json()["status"] == "cancelled"
+    assert client.get("/api/v1/users/user456/orders").json() == []
+
+
+def test_init_test_data_and_stats(client):
+    response = client.post("/api/v1/test/init")
+    assert response.status_code == 200
+    assert len(response.json()["created_orders"]) == 3
+
+    response = client.get("/api/v1/users/user789/orders")
+    assert response.status_code == 200
+    assert [order["price"] for order in response.json()] == [49500]
+
+    stats = client.get("/api/v1/stats").json()
+    assert stats["total_orders"] == 3
+    assert stats["active_symbols"] == [SYMBOL]
+    assert client.get("/health").json()["active_orders"] == 3
+
+
+def test_cancelled_request_still_settles_trades(engine):
+    async def scenario():
+        await engine.process_order(EngineOrder(
+            symbol=SYMBOL, side=OrderSide.SELL, order_type=OrderType.LIMIT,
+            quantity=1, price=100, user_id="user456",
+        ))
+        request = OrderRequest(
+            symbol=SYMBOL, side="buy", order_type="limit",
+            quantity=1, price=100, user_id="user123",
+        )
+        handler = asyncio.create_task(routes.place_order(request))
+        # 订单已提交撮合后取消请求处理
+        await asyncio.sleep(0)
+        handler.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await handler
+        await asyncio.gather(*routes.pending_settlements)
+        await engine.stop()
+
+    asyncio.run(scenario())
+
+    # 冻结金额已解冻，成交按撮合结果结算到双方
+    assert routes.user_balances["user123"] == {"BTC": 11.0, "USDT": 99900.0}
+    assert routes.user_balances["user456"] == {"BTC": 4.0, "USDT": 50100.0}
+
+
+def test_websocket_message_dispatch(client):
+    with client.websocket_connect("/ws/orders") as websocket:
+        websocket.send_text(json.dumps({"type": "subscribe", "symbol": "ETH/USDT"}))
+        assert _receive(websocket) == [{
+            "type": "subscribed", "symbol": "ETH/USDT", "message": "已订阅 ETH/USDT 市场数据"
+        }]
+
+        # 未指定交易对时订阅默认交易对
+        websocket.send_text(json.dumps({"type": "subscribe"}))
+        assert _receive(websocket)[0]["symbol"] == SYMBOL
+
+        websocket.send_text(json.dumps({"type": "place_order"}))
+        assert _receive(websocket)[0]["type"] == "info"
+
+        websocket.send_text(json.dumps({"type": "ping", "id": 1}))
+        assert _receive(websocket) == [{"type": "echo", "received": {"type": "ping", "id": 1}}]
+
+        websocket.send_text("not json")
+        assert _receive(websocket)[0]["type"] == "error"
+
+    # 断开后连接及其订阅全部移除（服务端在TestClient的事件循环线程中清理）
+    deadline = time.monotonic() + 1
+    while main.active_connections and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert main.active_connections == set()
+    assert main.subscriptions == {}
+
+
+def test_websocket_receives_pushes_for_subscribed_symbol(client):
+    with client.websocket_connect("/ws/orders") as websocket:
+        websocket.send_text(json.dumps({"type": "subscribe", "symbol": SYMBOL}))
+        _receive(websocket)
+
+        # 其他交易对的变更不会推送给该连接
+        response = client.post("/api/v1/orders", json={
+            "symbol": "ETH/USDT", "side": "buy", "order_type": "limit",
+            "quantity": 1, "price": 3000, "user_id": "user456",
+        })
+        assert response.json()["success"]
+        _place(client, "sell", 1, 49000, "user456")
+        _place(client, "buy", 0.25, 49000, "user123")
+
+        received = {}
+        symbols = set()
+        while "trade" not in received or "orderbook" not in received:
+            for message in _receive(websocket):
+                received.setdefault(message["type"], message)
+                symbols.add(message.get("symbol") or message["data"]["symbol"])
+
+        assert symbols == {SYMBOL}
+        assert received["trade"]["data"]["price"] == 49000
+        assert received["trade"]["data"]["quantity"] == 0.25
+        assert received["orderbook"]["symbol"] == SYMBOL
+
+
+def test_writer_failure_drops_and_closes_connection():
+    class BrokenWebSocket:
+        closed = False
+
+        async def send_bytes(self, payload):
+            raise RuntimeError("connection reset")
+
+        async def close(self):
+            self.closed = True
+
+    async def scenario():
+        websocket = BrokenWebSocket()
+        connection = main.ClientConnection(websocket)
+        main.active_connections.add(connection)
+        main.subscriptions.setdefault(SYMBOL, set()).add(connection)
+        connection.symbols.add(SYMBOL)
+
+        connection.writer = asyncio.create_task(main._writer(connection))
+        connection.send(b"{}")
+        await asyncio.wait_for(connection.writer, 1)
+        return websocket, connection
+
+    websocket, connection = asyncio.run(scenario())
+
+    assert connection.closed
+    assert websocket.closed
+    assert connection not in main.active_connections
+    assert SYMBOL not in main.subscriptions
@@ -0,0 +1,161 @@
+import asyncio
+
+from app.engine_core import EngineOrder
+from app.matcher import MatchingEngine
+from app.models import OrderSide, OrderStatus, OrderType, to_ticks
+
+SYMBOL = "BTC/USDT"
+
+
+def _order(side, quantity, price=None, user_id="user"):
+    return EngineOrder(
+        symbol=SYMBOL,
+        side=side,
+        order_type=OrderType.LIMIT if price is not None else OrderType.MARKET,
+        quantity=quantity,
+        price=price,
+        user_id=user_id,
+    )
+
+
+def _submit(engine, order):
+    return asyncio.run(engine.process_order(order))
+
+
+def test_price_time_priority():
+    engine = MatchingEngine()
+    first = _order(OrderSide.SELL, 1, 100, "s1")
+    second = _order(OrderSide.SELL, 1, 100, "s2")
+    better = _order(OrderSide.SELL, 1, 99, "s3")
+    for order in (first, second, better):
+        _submit(engine, order)
+
+    trades = _submit(engine, _order(OrderSide.BUY, 2, 100, "b"))
+
+    # 价格优先：先成交99的卖单；同价时间优先：再成交先挂的卖单
+    assert [trade.sell_order_id for trade in trades] == [better.id, first.id]
+    assert [trade.price for trade in trades] == [99, 100]
+    assert second.status == OrderStatus.PENDING
+    assert engine.get_depth(SYMBOL) == ([], [{"price": 100.0, "quantity": 1.0}])
+
+
+def test_partial_fill_of_resting_order():
+    engine = MatchingEngine()
+    resting = _order(OrderSide.SELL, 5, 100, "s")
+    _submit(engine, resting)
+
+    buy = _order(OrderSide.BUY, 2, 100, "b")
+    trades = _submit(engine, buy)
+
+    assert len(trades) == 1 and trades[0].quantity == 2
+    assert buy.status == OrderStatus.FILLED
+    assert resting.status == OrderStatus.PARTIAL
+    assert resting.filled_quantity == 2
+    assert resting.average_price == 100
+    assert engine.get_depth(SYMBOL) == ([], [{"price": 100.0, "quantity": 3.0}])
+
+    _submit(engine, _order(OrderSide.BUY, 3, 101, "b"))
+
+    assert resting.status == OrderStatus.FILLED
+    assert resting.filled_quantity == 5
+    assert engine.get_user_orders("s") == []
+    assert engine.get_depth(SYMBOL) == ([], [])
+
+
+def test_cancel_leaves_tombstone_and_same_price_order_matches():
+    engine = MatchingEngine()
+    cancelled = _order(OrderSide.SELL, 1, 100, "s1")
+    _submit(engine, cancelled)
+    assert asyncio.run(engine.cancel_order(cancelled.id, "s1"))
+
+    # 撤单只扣减聚合数量，订单作为墓碑留在档位队列中
+    book = engine.orders_by_symbol[SYMBOL]
+    assert cancelled.status == OrderStatus.CANCELLED
+    assert list(book.ask_queues[to_ticks(100)]) == [cancelled]
+    assert engine.get_depth(SYMBOL) == ([], [])
+    assert not asyncio.run(engine.cancel_order(cancelled.id, "s1"))
+
+    live = _order(OrderSide.SELL, 2, 100, "s2")
+    _submit(engine, live)
+    assert engine.get_depth(SYMBOL) == ([], [{"price": 100.0, "quantity": 2.0}])
+
+    trades = _submit(engine, _order(OrderSide.BUY, 1, 100, "b"))
+
+    assert [trade.sell_order_id for trade in trades] == [live.id]
+    assert list(book.ask_queues[to_ticks(100)]) == [live]
+    assert engine.get_depth(SYMBOL) == ([], [{"price": 100.0, "quantity": 1.0}])
+
+
+def test_market_order_remainder_is_cancelled():
+    engine = MatchingEngine()
+    _submit(engine, _order(OrderSide.SELL, 1, 100, "s"))
+
+    market = _order(OrderSide.BUY, 3, user_id="b")
+    trades = _submit(engine, market)
+
+    assert len(trades) == 1 and trades[0].quantity == 1
+    assert market.status == OrderStatus.CANCELLED
+    assert market.filled_quantity == 1
+    assert engine.get_user_orders("b") == []
+    assert engine.get_depth(SYMBOL) == ([], [])
+
+
+def test_market_order_without_opposite_side_is_cancelled():
+    engine = MatchingEngine()
+    _submit(engine, _order(OrderSide.BUY, 1, 99, "b1"))
+
+    market = _order(OrderSide.BUY, 1, user_id="b2")
+    assert _submit(engine, market) == []
+    assert market.status == OrderStatus.CANCELLED
+    assert engine.get_depth(SYMBOL) == ([{"price": 99.0, "quantity": 1.0}], [])
+
+
+def test_depth_and_best_prices_after_fills_and_cancels():
+    engine = MatchingEngine()
+    bid_99 = _order(OrderSide.BUY, 1, 99, "b1")
+    bid_98 = _order(OrderSide.BUY, 2, 98, "b2")
+    ask_101 = _order(OrderSide.SELL, 3, 101, "s1")
+    ask_102 = _order(OrderSide.SELL, 4, 102, "s2")
+    for order in (bid_99, bid_98, ask_101, ask_102):
+        _submit(engine, order)
+
+    book = engine.orders_by_symbol[SYMBOL]
+    assert (book.best_bid(), book.best_ask()) == (99, 101)
+
+    # 买一撤单后买一变为98
+    asyncio.run(engine.cancel_order(bid_99.id, "b1"))
+    assert book.best_bid() == 98
+
+    # 卖一部分成交后仍为101，数量减少
+    _submit(engine, _order(OrderSide.BUY, 1, 101, "b3"))
+    assert book.best_ask() == 101
+    assert engine.get_depth(SYMBOL) == (
+        [{"price": 98.0, "quantity": 2.0}],
+        [{"price": 101.0, "quantity": 2.0}, {"price": 102.0, "quantity": 4.0}],
+    )
+    assert engine.get_depth(SYMBOL, 1)[1] == [{"price": 101.0, "quantity": 2.0}]
+
+    # 吃掉整个101档位后卖一变为102
+    _submit(engine, _order(OrderSide.BUY, 2, 101, "b3"))
+    assert book.best_ask() == 102
+
+    asyncio.run(engine.cancel_order(bid_98.id, "b2"))
+    assert book.best_bid() is None
+    orderbook = engine.get_orderbook(SYMBOL)
+    assert orderbook.bids == []
+    assert orderbook.asks == [{"price": 102.0, "quantity": 4.0}]
+
+
+def test_get_trades_returns_newest_first():
+    engine = MatchingEngine()
+    sells = [_order(OrderSide.SELL, 1, 100 + i, "s") for i in range(3)]
+    for order in sells:
+        _submit(engine, order)
+    for _ in sells:
+        _submit(engine, _order(OrderSide.BUY, 1, 110, "b"))
+
+    trades = engine.get_trades(SYMBOL, 10)
+    assert [trade.sell_order_id for trade in trades] == [order.id for order in reversed(sells)]
+    assert [trade.price for trade in engine.get_trades(SYMBOL, 2)] == [102, 101]
+    assert engine.get_trades(SYMBOL, 0) == []
+    assert engine.get_trades("ETH/USDT", 10) == []
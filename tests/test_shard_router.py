@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from app import matcher
+from app.engine_core import EngineOrder
+from app.matcher import ShardRouter
+from app.models import OrderSide, OrderStatus, OrderType
+
+
+def _order(symbol, side, quantity, price=None, user_id="user"):
+    return EngineOrder(
+        symbol=symbol,
+        side=side,
+        order_type=OrderType.LIMIT if price is not None else OrderType.MARKET,
+        quantity=quantity,
+        price=price,
+        user_id=user_id,
+    )
+
+
+def test_orders_are_routed_by_symbol_and_cancelled_on_their_shard():
+    async def scenario():
+        router = ShardRouter()
+        btc = _order("BTC/USDT", OrderSide.SELL, 1, 100, "s")
+        eth = _order("ETH/USDT", OrderSide.SELL, 1, 10, "s")
+        await router.process_order(btc)
+        await router.process_order(eth)
+
+        assert btc.id in router.shard_for("BTC/USDT").active_orders
+        assert eth.id in router.shard_for("ETH/USDT").active_orders
+        assert sorted(router.symbols()) == ["BTC/USDT", "ETH/USDT"]
+
+        assert not await router.cancel_order(btc.id, "other")
+        assert await router.cancel_order(btc.id, "s")
+        assert btc.status == OrderStatus.CANCELLED
+        await router.stop()
+
+    asyncio.run(scenario())
+
+
+def test_queued_orders_are_matched_in_one_batch():
+    async def scenario():
+        router = ShardRouter()
+        batches = []
+
+        async def trade_listener(trades):
+            batches.append(trades)
+
+        router.trade_listener = trade_listener
+        sells = [_order("BTC/USDT", OrderSide.SELL, 1, 100 + i, "s") for i in range(3)]
+        for order in sells:
+            await router.process_order(order)
+        assert batches == []
+
+        # 三个市价买单在消费任务运行前全部入队，作为同一批撮合
+        buys = [_order("BTC/USDT", OrderSide.BUY, 1, user_id="b") for _ in range(3)]
+        results = await asyncio.gather(*(router.process_order(order) for order in buys))
+
+        assert [len(trades) for trades in results] == [1, 1, 1]
+        assert len(batches) == 1
+        assert [trade.sell_order_id for trade in batches[0]] == [order.id for order in sells]
+        assert all(order.status == OrderStatus.FILLED for order in buys)
+        await router.stop()
+
+    asyncio.run(scenario())
+
+
+def test_trade_listener_failure_does_not_fail_orders():
+    async def scenario():
+        router = ShardRouter()
+
+        async def trade_listener(trades):
+            raise RuntimeError("push failed")
+
+        router.trade_listener = trade_listener
+        await router.process_order(_order("BTC/USDT", OrderSide.SELL, 1, 100, "s"))
+        trades = await router.process_order(_order("BTC/USDT", OrderSide.BUY, 1, 100, "b"))
+
+        assert len(trades) == 1
+        assert router.trade_count() == 1
+        await router.stop()
+
+    asyncio.run(scenario())
+
+
+def test_full_shard_queue_rejects_orders(monkeypatch):
+    monkeypatch.setattr(matcher, "SHARD_QUEUE_SIZE", 2)
+
+    async def scenario():
+        router = ShardRouter(num_shards=1)
+        orders = [_order("BTC/USDT", OrderSide.SELL, 1, 100, "s") for _ in range(4)]
+        results = await asyncio.gather(*(router.process_order(order) for order in orders))
+
+        assert results == [[], [], [], []]
+        assert [order.status for order in orders] == [
+            OrderStatus.PENDING, OrderStatus.PENDING, OrderStatus.REJECTED, OrderStatus.REJECTED
+        ]
+        assert router.order_count() == 2
+        await router.stop()
+
+    asyncio.run(scenario())
+
+
+def test_stop_fails_orders_still_queued():
+    async def scenario():
+        router = ShardRouter()
+        order = _order("BTC/USDT", OrderSide.SELL, 1, 100, "s")
+        pending = asyncio.create_task(router.process_order(order))
+        # 订单入队后、消费任务运行前停止
+        await asyncio.sleep(0)
+        await router.stop()
+
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(pending, 1)
+        assert order.status == OrderStatus.REJECTED
+
+    asyncio.run(scenario())
+
+
+def test_user_orders_are_returned_in_placement_order_across_shards():
+    async def scenario():
+        router = ShardRouter()
+        orders = [
+            _order(f"COIN{i % 5}/USDT", OrderSide.SELL, 1, 100, "u")
+            for i in range(10)
+        ]
+        for order in orders:
+            await router.process_order(order)
+
+        assert [order.id for order in router.get_user_orders("u")] == [order.id for order in orders]
+        await router.cancel_order(orders[3].id, "u")
+        assert orders[3] not in router.get_user_orders("u")
+        await router.stop()
+
+    asyncio.run(scenario())
+
+
+def test_snapshot_loop_coalesces_book_changes_per_symbol():
+    async def scenario():
+        router = ShardRouter()
+        pushed = []
+
+        async def orderbook_listener(symbol):
+            pushed.append(symbol)
+
+        router.orderbook_listener = orderbook_listener
+        orders = [_order("BTC/USDT", OrderSide.SELL, 1, 100 + i, "s") for i in range(5)]
+        orders.append(_order("ETH/USDT", OrderSide.SELL, 1, 10, "s"))
+        await asyncio.gather(*(router.process_order(order) for order in orders))
+
+        # 一个刷新周期内的多次变更只推送一次
+        await asyncio.sleep(matcher.SNAPSHOT_INTERVAL * 3)
+        assert sorted(pushed) == ["BTC/USDT", "ETH/USDT"]
+
+        # 没有新变更时不再推送
+        await asyncio.sleep(matcher.SNAPSHOT_INTERVAL * 3)
+        assert len(pushed) == 2
+
+        await router.cancel_order(orders[0].id, "s")
+        await asyncio.sleep(matcher.SNAPSHOT_INTERVAL * 3)
+        assert pushed[2:] == ["BTC/USDT"]
+
+        orderbook = router.get_orderbook("BTC/USDT")
+        assert orderbook.last_updated.tzinfo is not None
+        await router.stop()
+
+    asyncio.run(scenario())